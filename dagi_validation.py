@@ -14,7 +14,6 @@ from __future__ import annotations
 
 import json
 from dataclasses import dataclass
-from itertools import combinations
 from typing import Dict, List, Mapping, Sequence, Tuple
 
 import networkx as nx
@@ -23,6 +22,11 @@ import numpy as np
 import Functions as f
 import LC_explore
 
+try:
+    import orjson
+except ImportError:  # optional: only speeds up writing dagi_results.json
+    orjson = None
+
 
 @dataclass
 class GraphStateData:
@@ -84,40 +88,66 @@ def build_graph_state() -> GraphStateData:
     )
 
 
-def gf2_rank(matrix: np.ndarray) -> int:
-    """Return the rank over GF(2) using Gaussian elimination."""
-    m = matrix.copy() % 2
-    rows, cols = m.shape
-    rank = 0
-    for col in range(cols):
-        pivot_row = None
-        for r in range(rank, rows):
-            if m[r, col] == 1:
-                pivot_row = r
-                break
-        if pivot_row is None:
-            continue
-        if pivot_row != rank:
-            m[[rank, pivot_row]] = m[[pivot_row, rank]]
-        for r in range(rows):
-            if r != rank and m[r, col] == 1:
-                m[r] = (m[r] + m[rank]) % 2
-        rank += 1
+def _pack_rows(matrix: np.ndarray) -> np.ndarray:
+    """Pack the rows of a 0/1 matrix into uint64 words, column 0 in the top bit."""
+    rows, cols = matrix.shape
+    words = (cols + 63) // 64
+    padded = np.zeros((rows, words * 64), dtype=np.uint8)
+    padded[:, :cols] = (matrix % 2).astype(np.uint8)
+    return np.packbits(padded, axis=1).view(">u8").astype(np.uint64)
+
+
+def _column_bit(col: int) -> Tuple[int, np.uint64]:
+    """Return the word index and bit mask of column ``col`` in a packed row."""
+    return col >> 6, np.uint64(1) << np.uint64(63 - (col & 63))
+
+
+def _packed_echelon(bits: np.ndarray, columns: Sequence[int]) -> List[int]:
+    """Row-reduce packed rows over GF(2), pivoting only on ``columns`` in order.
+
+    ``bits`` is reduced in place; row ``i`` of the result holds the pivot of the
+    ``i``-th returned column and is zero on every other pivot column.
+    """
+    rows = bits.shape[0]
+    pivots: List[int] = []
+    if not bits.any():
+        return pivots
+    for col in columns:
+        rank = len(pivots)
         if rank == rows:
             break
-    return rank
+        word, bit = _column_bit(col)
+        pivot_row = rank + int(np.argmax(bits[rank:, word] & bit))
+        if not bits[pivot_row, word] & bit:
+            continue
+        if pivot_row != rank:
+            bits[[rank, pivot_row]] = bits[[pivot_row, rank]]
+        # A single XOR per selected row replaces the element-wise mod-2 add.
+        selected = (bits[:, word] & bit).astype(bool)
+        selected[rank] = False
+        bits[selected] ^= bits[rank]
+        pivots.append(col)
+    return pivots
+
+
+def gf2_rank(matrix: np.ndarray) -> int:
+    """Return the rank over GF(2) using Gaussian elimination on bit-packed rows."""
+    return len(_packed_echelon(_pack_rows(matrix), range(matrix.shape[1])))
 
 
 def entropy_from_adjacency(adjacency: np.ndarray, subset: Sequence[int]) -> int:
     """Compute S(subset) in bits for a graph state using the rank formula."""
     if not subset:
         return 0
-    n = adjacency.shape[0]
-    keep = set(subset)
-    complement = [i for i in range(n) if i not in keep]
-    if not complement:
+    outside = np.ones(adjacency.shape[0], dtype=bool)
+    outside[list(subset)] = False
+    complement = np.flatnonzero(outside)
+    if complement.size == 0:
         return 0
     submatrix = adjacency[np.ix_(subset, complement)] % 2
+    if not submatrix.any():
+        # No edges leave the subset, so it is unentangled with the rest.
+        return 0
     return gf2_rank(submatrix)
 
 
@@ -128,50 +158,117 @@ def mutual_information(adjacency: np.ndarray, a: Sequence[int], b: Sequence[int]
     return a_entropy + b_entropy - joint_entropy
 
 
-def mutual_information_table(adjacency: np.ndarray, bulk: int, fragments: List[int]) -> Dict[Tuple[int, ...], float]:
-    result: Dict[Tuple[int, ...], float] = {}
-    bulk_set = [bulk]
-    for size in range(1, len(fragments) + 1):
-        for combo in combinations(fragments, size):
-            result[combo] = mutual_information(adjacency, bulk_set, combo)
-    return result
+def subset_from_mask(mask: int, fragments: Sequence[int]) -> Tuple[int, ...]:
+    """Decode a bitmask over ``fragments`` (bit i <-> fragments[i]) into a subset."""
+    return tuple(fragment for i, fragment in enumerate(fragments) if mask >> i & 1)
 
 
-def serialize_table(table: Mapping[Tuple[int, ...], float]) -> List[Dict[str, object]]:
-    """Produce a JSON-friendly, length-sorted table of subset values."""
-    return [
-        {"subset": list(subset), "value": value}
-        for subset, value in sorted(table.items(), key=lambda item: (len(item[0]), item[0]))
-    ]
+def mutual_information_table(adjacency: np.ndarray, bulk: int, fragments: List[int]) -> Dict[int, float]:
+    """Return I(bulk : subset) keyed by the subset's bitmask over ``fragments``.
+
+    Subsets are visited in Gray-code order, so each step toggles one qubit: its
+    row joins (or leaves) the submatrix while its column leaves (or joins) the
+    complement, both as a single XOR on the packed adjacency.
+
+    For a subset A let C be its complement without the bulk qubit. Eliminating
+    Γ[A, Ā] with the bulk column pivoted last gives T = rank_2(Γ[A, C]), and
+    S(A) = T + 1 exactly when the bulk column still finds a pivot. Reducing the
+    bulk row Γ[bulk, C] against the same basis gives S(A ∪ {bulk}) = T + 1
+    exactly when it is independent, so I = S(bulk) + S(A) - S(A ∪ {bulk}) costs
+    one elimination per subset instead of three.
+    """
+    n = adjacency.shape[0]
+    packed = _pack_rows(adjacency)
+    column_bits = _pack_rows(np.eye(n, dtype=np.uint8))
+    complement_bits = np.bitwise_or.reduce(column_bits, axis=0)
+    inside = np.zeros(n, dtype=bool)
+    not_bulk = np.arange(n) != bulk
+    bulk_word, bulk_bit = _column_bit(bulk)
+    # S(bulk) is the rank of the single row Γ[bulk, rest]: one if it has any edge.
+    bulk_row = packed[bulk].copy()
+    bulk_row[bulk_word] &= ~bulk_bit
+    bulk_entropy = int(bulk_row.any())
+
+    result: Dict[int, float] = {}
+    mask = 0
+    for step in range(1, 1 << len(fragments)):
+        index = (step & -step).bit_length() - 1
+        mask ^= 1 << index
+        qubit = fragments[index]
+        inside[qubit] = not inside[qubit]
+        complement_bits ^= column_bits[qubit]
+        if inside[bulk]:
+            # The bulk qubit is one of the fragments, so S(A ∪ {bulk}) = S(A).
+            result[mask] = bulk_entropy
+            continue
 
+        other_columns = np.flatnonzero(not_bulk & ~inside).tolist()
+        rows = packed[inside] & complement_bits
+        pivots = _packed_echelon(rows, [*other_columns, bulk])
+        bulk_pivot = bool(pivots) and pivots[-1] == bulk
+
+        residual = packed[bulk] & complement_bits
+        for row, col in enumerate(pivots[: len(pivots) - bulk_pivot]):
+            word, bit = _column_bit(col)
+            if residual[word] & bit:
+                residual ^= rows[row]
+        residual[bulk_word] &= ~bulk_bit
+        result[mask] = bulk_entropy + bulk_pivot - bool(residual.any())
+    return result
 
-def mobius_inversion(mi_table: Mapping[Tuple[int, ...], float]) -> Dict[Tuple[int, ...], float]:
-    """Recover Möbius f-values given I(bulk : subset)."""
-    f_values: Dict[Tuple[int, ...], float] = {}
-    for subset in sorted(mi_table.keys(), key=len):
-        total = mi_table[subset]
-        for smaller, value in f_values.items():
-            if set(smaller).issubset(subset):
-                total -= value
-        f_values[subset] = total
-    return f_values
 
+def serialize_table(table: Mapping[int, float], fragments: Sequence[int]) -> Dict[str, List[object]]:
+    """Produce a JSON-friendly, length-sorted table as parallel subset/value columns."""
+    items = sorted(
+        ((subset_from_mask(mask, fragments), value) for mask, value in table.items()),
+        key=lambda item: (len(item[0]), item[0]),
+    )
+    return {
+        "sizes": [len(subset) for subset, _ in items],
+        "subsets": [list(subset) for subset, _ in items],
+        "values": [value for _, value in items],
+    }
 
-def aggregate_fk(f_values: Mapping[Tuple[int, ...], float]) -> Dict[int, float]:
+
+def mobius_inversion(mi_table: Mapping[int, float]) -> Dict[int, float]:
+    """Recover Möbius f-values given I(bulk : subset), both keyed by bitmask.
+
+    ``mi_table`` must cover every non-empty subset of the fragments. The
+    inversion is applied one fragment bit at a time, ``f[mask] -= f[mask ^ bit]``,
+    which takes k·2^k updates instead of one per (subset, submask) pair.
+    """
+    order = sorted(mi_table, key=int.bit_count)
+    if not any(mi_table.values()):
+        # An all-zero table (e.g. the outside-wedge control) inverts to all zeros.
+        return {mask: mi_table[mask] for mask in order}
+
+    size = max(mi_table).bit_length()
+    values = [0] * (1 << size)
+    for mask, value in mi_table.items():
+        values[mask] = value
+    for index in range(size):
+        bit = 1 << index
+        # Visit only the masks that contain ``bit``: the upper half of each block.
+        for high in range(0, 1 << size, bit << 1):
+            for mask in range(high + bit, high + (bit << 1)):
+                values[mask] -= values[mask ^ bit]
+    return {mask: values[mask] for mask in order}
+
+
+def aggregate_fk(f_values: Mapping[int, float]) -> Dict[int, float]:
     fk: Dict[int, float] = {}
-    for subset, value in f_values.items():
-        fk[len(subset)] = fk.get(len(subset), 0.0) + value
+    for mask, value in f_values.items():
+        size = mask.bit_count()
+        fk[size] = fk.get(size, 0.0) + value
     return fk
 
 
 def running_synergy_ratio(fk: Mapping[int, float], total_info: float) -> List[Tuple[int, float]]:
-    ratios = []
-    cumulative = 0.0
-    for k in sorted(fk):
-        if k >= 3:
-            cumulative += fk[k]
-        ratios.append((k, 0.0 if total_info == 0 else cumulative / total_info))
-    return ratios
+    orders = np.array(sorted(fk), dtype=int)
+    contributions = np.array([fk[k] for k in orders.tolist()], dtype=np.float64)
+    cumulative = np.cumsum(np.where(orders >= 3, contributions, 0.0))
+    ratios = np.zeros_like(cumulative) if total_info == 0 else cumulative / total_info
+    return list(zip(orders.tolist(), ratios.tolist()))
 
 
 def analyze_fragments(
@@ -183,21 +280,33 @@ def analyze_fragments(
     mi_table = mutual_information_table(adjacency, bulk, ordered_fragments)
     f_values = mobius_inversion(mi_table)
     fk = aggregate_fk(f_values)
-    total_info = mi_table[tuple(ordered_fragments)]
+    total_info = mi_table[(1 << len(ordered_fragments)) - 1]
     ratios = running_synergy_ratio(fk, total_info)
 
     return {
         "label": label,
         "bulk_target": bulk,
         "fragment_set": ordered_fragments,
-        "mutual_information": serialize_table(mi_table),
-        "f_values": serialize_table(f_values),
+        "mutual_information": serialize_table(mi_table, ordered_fragments),
+        "f_values": serialize_table(f_values, ordered_fragments),
         "fk": fk,
         "synergy_ratio": ratios,
         "total_information": total_info,
     }
 
 
+def write_results(results: Mapping[str, object], path: str = "dagi_results.json") -> None:
+    """Write ``results`` as two-space indented JSON, using orjson when available."""
+    if orjson is None:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+            fh.write("\n")
+        return
+    options = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+    with open(path, "wb") as fh:
+        fh.write(orjson.dumps(results, option=options))
+
+
 def run_experiment() -> Dict[str, object]:
     graph_data = build_graph_state()
 
@@ -247,7 +356,5 @@ if __name__ == "__main__":
         print("Total I(bulk:fragments):", experiment["total_information"])
         print("f_k contributions:", experiment["fk"])
         print("Running R_{>=3}:", experiment["synergy_ratio"])
-    with open("dagi_results.json", "w", encoding="utf-8") as fh:
-        json.dump(results, fh, indent=2)
-        fh.write("\n")
+    write_results(results)
     print("Saved dagi_results.json")